@@ -100,6 +100,9 @@ WARNING_HOURS = 6
 
 CHECK_INTERVAL = 60  
 
+# Как часто (в секундах) изменения пользователей сбрасываются на диск одной записью
+SAVE_INTERVAL = 2
+
 
 DATA_FILE = "users_data.json"
 
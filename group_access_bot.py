@@ -1,13 +1,26 @@
 import asyncio
+import bisect
 import logging
-from datetime import datetime, timedelta
-from typing import Optional, Dict, List
+from abc import ABC, abstractmethod
+from datetime import datetime
+from functools import lru_cache
+from itertools import chain
+from typing import Awaitable, Optional, Dict, Iterator, List, Set, Tuple
 import json
+import os
 from pathlib import Path
 import sys
 import re
+import time
 
+import aiofiles
+import aiofiles.os
+try:
+    import orjson
+except ImportError:
+    orjson = None
 from aiogram import Bot, Dispatcher, F
+from aiogram.client.session.aiohttp import AiohttpSession
 from aiogram.filters import Command
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, ChatJoinRequest
 from aiogram.fsm.context import FSMContext
@@ -63,150 +76,380 @@ if not ADMIN_IDS:
     logger.error("❌ Не настроены ADMIN_IDS в config.py!")
     sys.exit(1)
 
+ADMIN_IDS = frozenset(ADMIN_IDS)
+
 if CHANNEL_ID == -1001234567890:
     logger.warning("⚠️ Возможно, CHANNEL_ID не настроен в config.py!")
 
 logger.info(f"Загружены настройки: {len(ADMIN_IDS)} админов, {len(TIME_BUTTONS)} кнопок времени")
 
-bot = Bot(token=BOT_TOKEN)
+# Одна сессия с пулом keep-alive соединений к api.telegram.org:
+# рассылка админам переиспользует TCP/TLS вместо новых рукопожатий
+session = AiohttpSession(limit=200)
+session._connector_init.update(limit_per_host=64, keepalive_timeout=60)
+bot = Bot(token=BOT_TOKEN, session=session)
 storage = MemoryStorage()
 dp = Dispatcher(storage=storage)
 
 DATA_FILE = Path(CONFIG_DATA_FILE)
 VIP_FILE = Path(CONFIG_VIP_FILE)
 
+# Задержка перед записью на диск: изменения за это время сохраняются одной записью
+try:
+    from config import SAVE_INTERVAL as SAVE_DEBOUNCE
+except ImportError:
+    # Старый config.py без SAVE_INTERVAL
+    SAVE_DEBOUNCE = 2
+
+# Журнал сжимается в снимок, когда в нем записей больше, чем COMPACT_RATIO * число пользователей
+COMPACT_RATIO = 10
+
+# Окно предупреждения в секундах - сравнивается напрямую с UNIX timestamp
+WARNING_SECONDS = WARNING_HOURS * 3600
+
+# Сколько удалений/предупреждений фоновая проверка отправляет одновременно
+CHECK_CONCURRENCY = 10
+
+# Предельная пауза (сек) между повторами фоновой проверки после ошибок
+CHECK_MAX_BACKOFF = 300
+
+
+# Сериализация в JSON: реализация выбирается один раз при импорте (orjson, если установлен)
+if orjson is not None:
+    dumps = orjson.dumps
+    loads = orjson.loads
+else:
+    def dumps(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+    
+    loads = json.loads
+
+
+async def write_file(path: Path, payload: bytes, mode: str = 'wb', sync: bool = False):
+    """Записать данные одним вызовом write(); fsync только по запросу.
+    
+    Полная перезапись ('wb') идет во временный файл с атомарной заменой через
+    os.replace, поэтому сбой во время записи не оставит обрезанный файл.
+    """
+    target = path.with_name(path.name + '.tmp') if mode == 'wb' else path
+    async with aiofiles.open(target, mode) as f:
+        await f.write(payload)
+        if sync:
+            await f.flush()
+            await asyncio.to_thread(os.fsync, f.fileno())
+    if target != path:
+        await aiofiles.os.replace(target, path)
+
 
 
 class UserData:
     """Данные о пользователе"""
+    __slots__ = ("user_id", "username", "expires_at", "warning_sent")
+    
     def __init__(self, user_id: int, username: str = None):
         self.user_id = user_id
         self.username = username
-        self.expires_at: Optional[datetime] = None
+        self.expires_at: Optional[int] = None  # UNIX timestamp, секунды
         self.warning_sent = False
     
-    def to_dict(self):
-        return {
-            'user_id': self.user_id,
-            'username': self.username,
-            'expires_at': self.expires_at.isoformat() if self.expires_at else None,
-            'warning_sent': self.warning_sent
-        }
+    def to_tuple(self) -> tuple:
+        """Компактное представление для хранения: (user_id, username, expires_at, warning_sent)"""
+        return (self.user_id, self.username, self.expires_at, self.warning_sent)
+    
+    @staticmethod
+    def from_tuple(data) -> 'UserData':
+        user_id, username, expires_at, warning_sent = data
+        user = UserData(user_id, username)
+        user.expires_at = expires_at
+        user.warning_sent = warning_sent
+        return user
     
     @staticmethod
     def from_dict(data: dict):
+        """Старый формат хранения - словарь с именами полей"""
         user = UserData(data['user_id'], data.get('username'))
-        if data.get('expires_at'):
-            user.expires_at = datetime.fromisoformat(data['expires_at'])
+        expires_at = data.get('expires_at')
+        if isinstance(expires_at, str):
+            # Старый формат: ISO-строка
+            expires_at = int(datetime.fromisoformat(expires_at).timestamp())
+        user.expires_at = expires_at
         user.warning_sent = data.get('warning_sent', False)
         return user
 
 
-class DataManager:
+class PersistentManager(ABC):
+    """Отложенное сохранение данных на диск в фоновой задаче"""
     def __init__(self):
+        self._dirty = asyncio.Event()
+        self._save_lock = asyncio.Lock()
+    
+    def schedule_save(self):
+        """Пометить данные измененными - запись произойдет в фоне"""
+        self._dirty.set()
+    
+    @abstractmethod
+    async def save_data(self, sync: bool = False):
+        """Записать данные на диск"""
+    
+    async def _writer_loop(self):
+        while True:
+            await self._dirty.wait()
+            await asyncio.sleep(SAVE_DEBOUNCE)
+            self._dirty.clear()
+            async with self._save_lock:
+                await self.save_data()
+    
+    async def flush(self):
+        """Записать несохраненные изменения немедленно (с fsync - при остановке бота)"""
+        # Блокировку берем всегда: дожидаемся записи, которую уже начал _writer_loop
+        async with self._save_lock:
+            if self._dirty.is_set():
+                self._dirty.clear()
+                await self.save_data(sync=True)
+
+
+class DataManager(PersistentManager):
+    """Пользователи хранятся как снимок DATA_FILE + журнал изменений (JSONL)"""
+    def __init__(self):
+        super().__init__()
         self.users: Dict[int, UserData] = {}
+        # Отсортированный по времени истечения индекс (expires_at, user_id)
+        self._by_expiry: List[Tuple[int, int]] = []
+        # Устанавливается при изменении срока доступа - будит фоновую проверку
+        self.expiry_changed = asyncio.Event()
+        self._log_file = DATA_FILE.with_suffix('.jsonl')
+        self._pending: List[list] = []
+        self._log_size = 0
         self.load_data()
     
     def load_data(self):
         if DATA_FILE.exists():
             try:
-                with open(DATA_FILE, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.users = {
-                        int(uid): UserData.from_dict(udata) 
-                        for uid, udata in data.items()
-                    }
-                logger.info(f"Загружено {len(self.users)} пользователей")
+                with open(DATA_FILE, 'rb') as f:
+                    data = loads(f.read())
+                if isinstance(data, dict):
+                    users = (UserData.from_dict(udata) for udata in data.values())
+                else:
+                    users = (UserData.from_tuple(row) for row in data)
+                self.users = {user.user_id: user for user in users}
             except Exception as e:
                 logger.error(f"Ошибка загрузки данных: {e}")
-    
-    def save_data(self):
+        
+        if self._log_file.exists():
+            try:
+                # good_end - конец последней целой записи; все, что дальше, - оборванный хвост
+                offset = good_end = 0
+                line = b""
+                with open(self._log_file, 'rb') as f:
+                    for line in f:
+                        offset += len(line)
+                        if line.strip():
+                            try:
+                                self._apply(loads(line))
+                            except ValueError:
+                                # Оборванная запись после аварийного завершения
+                                logger.warning("Пропущена поврежденная запись журнала")
+                                continue
+                            self._log_size += 1
+                        good_end = offset
+                
+                # Иначе следующая дописанная запись приклеится к хвосту и тоже будет потеряна
+                if good_end < offset:
+                    os.truncate(self._log_file, good_end)
+                elif offset and not line.endswith(b"\n"):
+                    with open(self._log_file, 'ab') as f:
+                        f.write(b"\n")
+            except Exception as e:
+                logger.error(f"Ошибка чтения журнала: {e}")
+        
+        self._by_expiry = sorted(
+            (user.expires_at, user.user_id) for user in self.users.values() if user.expires_at
+        )
+        logger.info(f"Загружено {len(self.users)} пользователей")
+    
+    def _apply(self, record: list):
+        # ["upsert", user_id, username, expires_at, warning_sent] | ["remove", user_id]
+        if record[0] == 'upsert':
+            user = UserData.from_tuple(record[1:])
+            self.users[user.user_id] = user
+        elif record[0] == 'remove':
+            self.users.pop(record[1], None)
+    
+    def _index_add(self, user: UserData):
+        if user.expires_at:
+            bisect.insort(self._by_expiry, (user.expires_at, user.user_id))
+    
+    def _index_remove(self, user: UserData):
+        if user.expires_at:
+            key = (user.expires_at, user.user_id)
+            i = bisect.bisect_left(self._by_expiry, key)
+            if i < len(self._by_expiry) and self._by_expiry[i] == key:
+                del self._by_expiry[i]
+    
+    def next_expiry(self) -> Optional[int]:
+        """Ближайшее время истечения среди всех пользователей"""
+        return self._by_expiry[0][0] if self._by_expiry else None
+    
+    def _expiry_position(self, moment: float) -> int:
+        """Индекс в _by_expiry первого пользователя, истекающего позже moment"""
+        return bisect.bisect_right(self._by_expiry, (moment, float('inf')))
+    
+    # Итераторы идут по срезу индекса, поэтому пользователей можно удалять по ходу обхода
+    
+    def iter_expired(self, now: float) -> Iterator[UserData]:
+        """Пользователи, чей доступ истек к моменту now"""
+        for _, user_id in self._by_expiry[:self._expiry_position(now)]:
+            yield self.users[user_id]
+    
+    def iter_active(self, now: float) -> Iterator[UserData]:
+        """Пользователи с действующим доступом, в порядке истечения"""
+        for _, user_id in self._by_expiry[self._expiry_position(now):]:
+            yield self.users[user_id]
+    
+    def iter_needing_warning(self, now: float, threshold: float) -> Iterator[UserData]:
+        """Активные пользователи без предупреждения, чей доступ истекает не позже threshold"""
+        start, end = self._expiry_position(now), self._expiry_position(threshold)
+        for _, user_id in self._by_expiry[start:end]:
+            user = self.users[user_id]
+            if not user.warning_sent:
+                yield user
+    
+    def split_by_expiry(self, now: float) -> Tuple[List[UserData], List[UserData]]:
+        """(активные, истекшие) одним поиском по индексу, оба списка в порядке истечения"""
+        split = self._expiry_position(now)
+        users = self.users
+        active = [users[user_id] for _, user_id in self._by_expiry[split:]]
+        expired = [users[user_id] for _, user_id in self._by_expiry[:split]]
+        return active, expired
+    
+    def _log(self, record: list):
+        self._pending.append(record)
+        self.schedule_save()
+    
+    async def save_data(self, sync: bool = False):
+        records, self._pending = self._pending, []
         try:
-            data = {str(uid): user.to_dict() for uid, user in self.users.items()}
-            with open(DATA_FILE, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            logger.info("Данные сохранены")
+            if records:
+                payload = b"".join(dumps(r) + b"\n" for r in records)
+                await write_file(self._log_file, payload, mode='ab', sync=sync)
+                self._log_size += len(records)
+                logger.debug(f"В журнал записано {len(records)} изменений")
+                # Уже в журнале - если упадет сжатие, повторно не дописываем
+                records = []
+            
+            if self._log_size > COMPACT_RATIO * max(len(self.users), 1):
+                await self.compact(sync=sync)
         except Exception as e:
+            self._pending[:0] = records
             logger.error(f"Ошибка сохранения данных: {e}")
+            # Повторим запись в следующем цикле (или при flush())
+            self.schedule_save()
+    
+    async def compact(self, sync: bool = False):
+        """Записать снимок всех пользователей и очистить журнал"""
+        data = [user.to_tuple() for user in self.users.values()]
+        payload = dumps(data)
+        await write_file(DATA_FILE, payload, sync=sync)
+        await write_file(self._log_file, b"", sync=sync)
+        self._log_size = 0
+        logger.info("Данные сохранены")
     
     def get_user(self, user_id: int) -> Optional[UserData]:
         return self.users.get(user_id)
     
     def add_or_update_user(self, user_id: int, username: str = None, 
                           hours: float = None) -> UserData:
-        if user_id not in self.users:
-            self.users[user_id] = UserData(user_id, username)
-        
-        user = self.users[user_id]
-        if username:
+        user = self.users.get(user_id)
+        if user is None:
+            user = UserData(user_id, username)
+            self.users[user_id] = user
+        elif username:
             user.username = username
         
         if hours is not None:
-            if user.expires_at and user.expires_at > datetime.now():
-                user.expires_at += timedelta(hours=hours)
+            self._index_remove(user)
+            now = int(time.time())
+            if user.expires_at and user.expires_at > now:
+                user.expires_at += int(hours * 3600)
             else:
-                user.expires_at = datetime.now() + timedelta(hours=hours)
+                user.expires_at = now + int(hours * 3600)
             user.warning_sent = False
+            self._index_add(user)
+            self.expiry_changed.set()
         
-        self.save_data()
+        self._log(['upsert', *user.to_tuple()])
         return user
     
     def remove_user(self, user_id: int):
-        if user_id in self.users:
-            del self.users[user_id]
-            self.save_data()
-    
-    def get_all_users(self):
+        user = self.users.pop(user_id, None)
+        if user is not None:
+            self._index_remove(user)
+            self._log(['remove', user_id])
+    
+    def set_warning_sent(self, user_id: int):
+        user = self.users.get(user_id)
+        if user:
+            user.warning_sent = True
+            self._log(['upsert', *user.to_tuple()])
+    
+    def get_all_users(self) -> List[UserData]:
         return list(self.users.values())
     
-    def has_valid_access(self, user_id: int) -> bool:
-        user = self.get_user(user_id)
-        if not user or not user.expires_at:
+    def has_valid_access(self, user_id: int, now: Optional[float] = None) -> bool:
+        user = self.users.get(user_id)
+        if user is None or not user.expires_at:
             return False
-        return user.expires_at > datetime.now()
+        return user.expires_at > (now if now is not None else time.time())
 
 
-class VIPManager:
+class VIPManager(PersistentManager):
     def __init__(self):
-        self.vip_users: List[int] = []
+        super().__init__()
+        self.vip_users: Set[int] = set()
         self.load_data()
     
     def load_data(self):
         if VIP_FILE.exists():
             try:
-                with open(VIP_FILE, 'r', encoding='utf-8') as f:
-                    self.vip_users = json.load(f)
+                with open(VIP_FILE, 'rb') as f:
+                    # Обновляем на месте: is_special_user привязан к этому множеству
+                    self.vip_users.update(loads(f.read()))
                 logger.info(f"Загружено {len(self.vip_users)} VIP пользователей")
             except Exception as e:
                 logger.error(f"Ошибка загрузки VIP: {e}")
     
-    def save_data(self):
+    async def save_data(self, sync: bool = False):
         try:
-            with open(VIP_FILE, 'w', encoding='utf-8') as f:
-                json.dump(self.vip_users, f, indent=2)
+            payload = dumps(sorted(self.vip_users))
+            await write_file(VIP_FILE, payload, sync=sync)
             logger.info("VIP данные сохранены")
         except Exception as e:
             logger.error(f"Ошибка сохранения VIP: {e}")
+            self.schedule_save()
     
     def add_vip(self, user_id: int):
         """Добавить VIP пользователя"""
         if user_id not in self.vip_users:
-            self.vip_users.append(user_id)
-            self.save_data()
+            self.vip_users.add(user_id)
+            self.schedule_save()
     
     def remove_vip(self, user_id: int):
         """Удалить VIP пользователя"""
         if user_id in self.vip_users:
-            self.vip_users.remove(user_id)
-            self.save_data()
+            self.vip_users.discard(user_id)
+            self.schedule_save()
     
     def is_vip(self, user_id: int) -> bool:
         """Проверить, является ли пользователь VIP"""
         return user_id in self.vip_users
     
+    def count(self) -> int:
+        """Количество VIP"""
+        return len(self.vip_users)
+    
     def get_all_vips(self) -> List[int]:
         """Получить всех VIP"""
-        return self.vip_users.copy()
+        return sorted(self.vip_users)
 
 
 data_manager = DataManager()
@@ -221,26 +464,34 @@ class UserManagement(StatesGroup):
 
 
 
-def is_admin(user_id: int) -> bool:
-    """Проверка, является ли пользователь админом"""
-    return user_id in ADMIN_IDS
-
+# Проверка, является ли пользователь админом
+is_admin = ADMIN_IDS.__contains__
 
-def is_special_user(user_id: int) -> bool:
-    """Проверка, является ли пользователь VIP"""
-    return vip_manager.is_vip(user_id)
+# Проверка, является ли пользователь VIP - связанный метод живого множества VIP,
+# поэтому добавление/удаление VIP видно сразу, без лишних вызовов в цикле проверки
+is_special_user = vip_manager.vip_users.__contains__
 
 
-def format_time_remaining(expires_at: datetime) -> str:
+def format_time_remaining(expires_at: int, now: Optional[float] = None) -> str:
     """Форматирование оставшегося времени"""
-    now = datetime.now()
+    if now is None:
+        now = time.time()
     if expires_at <= now:
         return "⏰ Истекло"
     
-    delta = expires_at - now
-    days = delta.days
-    hours = delta.seconds // 3600
-    minutes = (delta.seconds % 3600) // 60
+    return _format_minutes(int(expires_at - now) // 60)
+
+
+def format_expires_date(expires_at: int) -> str:
+    """Дата истечения для отображения"""
+    return datetime.fromtimestamp(expires_at).strftime('%d.%m.%Y %H:%M')
+
+
+@lru_cache(maxsize=4096)
+def _format_minutes(total_minutes: int) -> str:
+    """Строка вида "1д 2ч" - зависит только от числа минут, поэтому кэшируется"""
+    days, rest = divmod(total_minutes, 24 * 60)
+    hours, minutes = divmod(rest, 60)
     
     parts = []
     if days > 0:
@@ -253,7 +504,16 @@ def format_time_remaining(expires_at: datetime) -> str:
     return " ".join(parts) if parts else "< 1м"
 
 
-async def resolve_user_identifier(identifier: str) -> tuple[Optional[int], Optional[str]]:
+@lru_cache(maxsize=4096)
+def render_user_row(user_id: int, username: Optional[str], minutes_left: Optional[int]) -> str:
+    """Строка пользователя в списке /users; minutes_left=None - доступ истек"""
+    name = f"@{username}" if username else f"ID: {user_id}"
+    if minutes_left is None:
+        return f"• {name}\n  ❌ Доступ истек\n\n"
+    return f"• {name}\n  ⏰ Осталось: {_format_minutes(minutes_left)}\n\n"
+
+
+def resolve_user_identifier(identifier: str) -> tuple[Optional[int], Optional[str]]:
     """
     Определить user_id и username из введенных данных
     Возвращает (user_id, username)
@@ -267,11 +527,71 @@ async def resolve_user_identifier(identifier: str) -> tuple[Optional[int], Optio
     return None, None
 
 
+# Ссылки на фоновые задачи, чтобы их не собрал сборщик мусора до завершения
+_background_tasks: Set[asyncio.Task] = set()
+
+
+def _background_task_done(task: asyncio.Task):
+    _background_tasks.discard(task)
+    # Результат никто не ждет - иначе ошибка всплывет только при сборке мусора
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Ошибка фонового запроса: {task.exception()}")
+
+
+def run_in_background(aw: Awaitable) -> asyncio.Task:
+    """Запустить корутину или метод aiogram (callback.answer() и т.п.) без ожидания результата"""
+    # ensure_future, а не create_task: методы aiogram - awaitable-объекты, а не корутины
+    task = asyncio.ensure_future(aw)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_task_done)
+    return task
+
+
+async def run_limited(semaphore: asyncio.Semaphore, coro):
+    async with semaphore:
+        return await coro
+
+
+async def remove_from_channel(user_id: int):
+    """Удалить пользователя из канала, оставив возможность вернуться"""
+    await bot.ban_chat_member(CHANNEL_ID, user_id)
+    # Ошибка снятия бана всплывает к вызывающему: kick_user не удалит пользователя из базы
+    # и повторит попытку на следующей проверке (only_if_banned делает повтор безопасным)
+    await bot.unban_chat_member(CHANNEL_ID, user_id, only_if_banned=True)
+
+
+async def notify_admins(text: str, **kwargs):
+    """Отправить сообщение всем админам параллельно"""
+    await asyncio.gather(
+        *(bot.send_message(admin_id, text, **kwargs) for admin_id in ADMIN_IDS),
+        return_exceptions=True
+    )
+
+
+# Последнее содержимое, отправленное в каждое сообщение бота: (chat_id, message_id) -> (text, reply_markup)
+_last_rendered: Dict[Tuple[int, int], tuple] = {}
+_LAST_RENDERED_LIMIT = 1024
+
+
+async def edit_message(message: Message, text: str, **kwargs):
+    """Изменить сообщение бота; если содержимое не изменилось - запрос не отправляется"""
+    key = (message.chat.id, message.message_id)
+    payload = (text, kwargs.get('reply_markup'))
+    if _last_rendered.get(key) == payload:
+        return
+    await message.edit_text(text, **kwargs)
+    _last_rendered.pop(key, None)
+    if len(_last_rendered) >= _LAST_RENDERED_LIMIT:
+        # Забываем самое старое сообщение
+        del _last_rendered[next(iter(_last_rendered))]
+    _last_rendered[key] = payload
+
+
 async def notify_user_subscription(user_id: int, user: UserData):
     """Отправить пользователю уведомление о предоставлении доступа"""
     try:
         time_left = format_time_remaining(user.expires_at)
-        expires_date = user.expires_at.strftime('%d.%m.%Y %H:%M')
+        expires_date = format_expires_date(user.expires_at)
         
         notification = USER_SUBSCRIPTION_GRANTED.format(
             expires_date=expires_date,
@@ -286,39 +606,26 @@ async def notify_user_subscription(user_id: int, user: UserData):
         logger.error(f"Ошибка при отправке уведомления пользователю {user_id}: {e}")
 
 
+# Кнопки времени по 2 в ряд - раскладка не меняется, считаем один раз
+_TIME_BUTTON_ROWS = [TIME_BUTTONS[i:i + 2] for i in range(0, len(TIME_BUTTONS), 2)]
+
+# Статичный ряд под списком пользователей - один экземпляр на все отрисовки
+_ADD_USER_ROW = [InlineKeyboardButton(text="➕ Добавить пользователя", callback_data="add_new_user")]
+
+
 def create_time_keyboard(user_id: int) -> InlineKeyboardMarkup:
     """Создание клавиатуры с кнопками времени"""
-    buttons = []
-    
-    # Кнопки времени по 2 в ряд
-    for i in range(0, len(TIME_BUTTONS), 2):
-        row = []
-        for j in range(2):
-            if i + j < len(TIME_BUTTONS):
-                label, hours = TIME_BUTTONS[i + j]
-                row.append(InlineKeyboardButton(
-                    text=f"➕ {label}",
-                    callback_data=f"add_time:{user_id}:{hours}"
-                ))
-        buttons.append(row)
-    
-    # Кнопка для ввода своего времени
-    buttons.append([InlineKeyboardButton(
-        text="⏱ Свое время",
-        callback_data=f"custom_time:{user_id}"
-    )])
-    
-    # Кнопка для удаления пользователя
-    buttons.append([InlineKeyboardButton(
-        text="🗑 Удалить",
-        callback_data=f"remove_user:{user_id}"
-    )])
-    
-    # Кнопка назад
-    buttons.append([InlineKeyboardButton(
-        text="◀️ Назад",
-        callback_data="back_to_list"
-    )])
+    buttons = [
+        [
+            InlineKeyboardButton(text=f"➕ {label}", callback_data=f"add_time:{user_id}:{hours}")
+            for label, hours in row
+        ]
+        for row in _TIME_BUTTON_ROWS
+    ]
+    
+    buttons.append([InlineKeyboardButton(text="⏱ Свое время", callback_data=f"custom_time:{user_id}")])
+    buttons.append([InlineKeyboardButton(text="🗑 Удалить", callback_data=f"remove_user:{user_id}")])
+    buttons.append([InlineKeyboardButton(text="◀️ Назад", callback_data="back_to_list")])
     
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
@@ -329,9 +636,7 @@ async def kick_user(user_id: int):
         username = user.username if user and user.username else str(user_id)
         
         kick_msg = KICK_MESSAGE.format(username=username, user_id=user_id)
-        await bot.ban_chat_member(CHANNEL_ID, user_id)
-        await bot.unban_chat_member(CHANNEL_ID, user_id)
-        
+        await remove_from_channel(user_id)
         
         logger.info(f"Пользователь {user_id} удален из канала")
         
@@ -341,15 +646,10 @@ async def kick_user(user_id: int):
         except Exception:
             pass  # Игнорируем, если не можем отправить ЛС
         
-        for admin_id in ADMIN_IDS:
-            try:
-                await bot.send_message(
-                    admin_id,
-                    f"✅ Пользователь @{username} (ID: {user_id}) удален из канала.\n"
-                    f"Время доступа истекло."
-                )
-            except Exception:
-                pass
+        await notify_admins(
+            f"✅ Пользователь @{username} (ID: {user_id}) удален из канала.\n"
+            f"Время доступа истекло."
+        )
         
         data_manager.remove_user(user_id)
         
@@ -376,20 +676,14 @@ async def send_warning(user_id: int):
             pass
         
         username = user.username if user.username else str(user_id)
-        for admin_id in ADMIN_IDS:
-            try:
-                await bot.send_message(
-                    admin_id,
-                    f"⚠️ Скоро истечет доступ:\n"
-                    f"👤 @{username} (ID: {user_id})\n"
-                    f"⏰ Осталось: {time_left}",
-                    parse_mode="HTML"
-                )
-            except Exception:
-                pass
+        await notify_admins(
+            f"⚠️ Скоро истечет доступ:\n"
+            f"👤 @{username} (ID: {user_id})\n"
+            f"⏰ Осталось: {time_left}",
+            parse_mode="HTML"
+        )
         
-        user.warning_sent = True
-        data_manager.save_data()
+        data_manager.set_warning_sent(user_id)
         
         logger.info(f"Предупреждение отправлено пользователю {user_id}")
         
@@ -410,56 +704,44 @@ async def handle_join_request(join_request: ChatJoinRequest):
             
             logger.info(f"✅ VIP пользователь {user_id} одобрен автоматически")
             
-            for admin_id in ADMIN_IDS:
-                try:
-                    await bot.send_message(
-                        admin_id,
-                        f"✅ <b>VIP одобрен автоматически</b>\n\n"
-                        f"👤 @{username} (ID: {user_id})\n"
-                        f"👑 VIP статус",
-                        parse_mode="HTML"
-                    )
-                except Exception:
-                    pass
+            await notify_admins(
+                f"✅ <b>VIP одобрен автоматически</b>\n\n"
+                f"👤 @{username} (ID: {user_id})\n"
+                f"👑 VIP статус",
+                parse_mode="HTML"
+            )
             
             return
         except Exception as e:
             logger.error(f"Ошибка при одобрении VIP: {e}")
             return
     
-    if data_manager.has_valid_access(user_id):
+    now = time.time()
+    if data_manager.has_valid_access(user_id, now):
         try:
             await join_request.approve()
             
             user = data_manager.get_user(user_id)
-            time_left = format_time_remaining(user.expires_at)
-            expires_date = user.expires_at.strftime('%d.%m.%Y %H:%M')
+            time_left = format_time_remaining(user.expires_at, now)
+            expires_date = format_expires_date(user.expires_at)
             
             logger.info(f"✅ Пользователь {user_id} одобрен (доступ до {expires_date})")
             
-            for admin_id in ADMIN_IDS:
-                try:
-                    approval_msg = APPROVED_MESSAGE.format(
-                        username=f"@{username}",
-                        expires_date=expires_date,
-                        time_left=time_left
-                    )
-                    await bot.send_message(admin_id, approval_msg, parse_mode="HTML")
-                except Exception:
-                    pass
+            approval_msg = APPROVED_MESSAGE.format(
+                username=f"@{username}",
+                expires_date=expires_date,
+                time_left=time_left
+            )
+            await notify_admins(approval_msg, parse_mode="HTML")
             
         except Exception as e:
             logger.error(f"Ошибка при одобрении заявки: {e}")
     else:
         logger.info(f"❌ Заявка от {user_id} не одобрена - нет доступа")
         
-        for admin_id in ADMIN_IDS:
-            try:
-                decline_msg = DECLINED_MESSAGE.format(username=f"@{username}")
-                decline_msg += f"\n\nℹ️ Заявка висит. Добавьте доступ командой:\n/add {user_id}"
-                await bot.send_message(admin_id, decline_msg, parse_mode="HTML")
-            except Exception:
-                pass
+        decline_msg = DECLINED_MESSAGE.format(username=f"@{username}")
+        decline_msg += f"\n\nℹ️ Заявка висит. Добавьте доступ командой:\n/add {user_id}"
+        await notify_admins(decline_msg, parse_mode="HTML")
 
 
 # ==================== ОБРАБОТЧИКИ КОМАНД ====================
@@ -496,11 +778,12 @@ async def cmd_info(message: Message):
         return
     
     user = data_manager.get_user(user_id)
-    print(user)
+    logger.debug("Запрос /info от %s", user_id)
     if user and user.expires_at:
-        if user.expires_at > datetime.now():
-            time_left = format_time_remaining(user.expires_at)
-            expires_date = user.expires_at.strftime('%d.%m.%Y %H:%M')
+        now = time.time()
+        if user.expires_at > now:
+            time_left = format_time_remaining(user.expires_at, now)
+            expires_date = format_expires_date(user.expires_at)
             
             info_text = SUBSCRIPTION_ACTIVE_MESSAGE.format(
                 expires_date=expires_date,
@@ -523,20 +806,21 @@ async def cmd_vip(message: Message):
     
     vip_users = vip_manager.get_all_vips()
     
-    text = "<b>👑 VIP пользователи (бессрочный доступ):</b>\n\n"
+    parts = ["<b>👑 VIP пользователи (бессрочный доступ):</b>\n\n"]
     
     if vip_users:
         for user_id in vip_users:
             # trying to get username
             user = data_manager.get_user(user_id)
             if user and user.username:
-                text += f"• @{user.username} (ID: {user_id})\n"
+                parts.append(f"• @{user.username} (ID: {user_id})\n")
             else:
-                text += f"• ID: {user_id}\n"
+                parts.append(f"• ID: {user_id}\n")
     else:
-        text += "Нет VIP пользователей\n"
+        parts.append("Нет VIP пользователей\n")
     
-    text += f"\n<b>Всего:</b> {len(vip_users)}"
+    parts.append(f"\n<b>Всего:</b> {len(vip_users)}")
+    text = "".join(parts)
     
     buttons = [
         [InlineKeyboardButton(text="➕ Добавить VIP", callback_data="add_vip")],
@@ -553,44 +837,38 @@ async def cmd_users(message: Message):
     if not is_admin(message.from_user.id):
         return
     
-    users = data_manager.get_all_users()
-    
-    if not users:
+    if not data_manager.users:
         await message.answer("📭 Нет пользователей с ограниченным доступом.")
         return
     
-    # Сортируем по времени истечения
-    active_users = [u for u in users if u.expires_at and u.expires_at > datetime.now()]
-    expired_users = [u for u in users if u.expires_at and u.expires_at <= datetime.now()]
+    now = time.time()
+    # Индекс уже отсортирован по времени истечения
+    active_users, expired_users = data_manager.split_by_expiry(now)
     
-    text = "<b>👥 Пользователи с доступом:</b>\n\n"
+    parts = ["<b>👥 Пользователи с доступом:</b>\n\n"]
     
     if active_users:
-        text += "<b>✅ Активные:</b>\n"
-        for user in sorted(active_users, key=lambda x: x.expires_at):
-            username = f"@{user.username}" if user.username else f"ID: {user.user_id}"
-            time_left = format_time_remaining(user.expires_at)
-            text += f"• {username}\n  ⏰ Осталось: {time_left}\n\n"
+        parts.append("<b>✅ Активные:</b>\n")
+        for user in active_users:
+            minutes_left = int(user.expires_at - now) // 60
+            parts.append(render_user_row(user.user_id, user.username, minutes_left))
     
     if expired_users:
-        text += "<b>⏰ Истекшие:</b>\n"
+        parts.append("<b>⏰ Истекшие:</b>\n")
         for user in expired_users:
-            username = f"@{user.username}" if user.username else f"ID: {user.user_id}"
-            text += f"• {username}\n  ❌ Доступ истек\n\n"
-    
-    text += f"\n<b>👑 VIP пользователей:</b> {len(vip_manager.get_all_vips())}"
-    buttons = []
-    for user in active_users + expired_users:
-        username = user.username if user.username else str(user.user_id)
-        buttons.append([InlineKeyboardButton(
-            text=f"👤 {username}",
+            parts.append(render_user_row(user.user_id, user.username, None))
+    
+    parts.append(f"\n<b>👑 VIP пользователей:</b> {vip_manager.count()}")
+    text = "".join(parts)
+    buttons = [
+        [InlineKeyboardButton(
+            text=f"👤 {user.username or user.user_id}",
             callback_data=f"user_info:{user.user_id}"
-        )])
+        )]
+        for user in chain(active_users, expired_users)
+    ]
     
-    buttons.append([InlineKeyboardButton(
-        text="➕ Добавить пользователя",
-        callback_data="add_new_user"
-    )])
+    buttons.append(_ADD_USER_ROW)
     
     keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
     
@@ -625,7 +903,7 @@ async def process_user_id(message: Message, state: FSMContext):
         return
     
     try:
-        user_id, username = await resolve_user_identifier(message.text)
+        user_id, username = resolve_user_identifier(message.text)
         
         if not user_id and not username:
             await message.answer(
@@ -688,7 +966,7 @@ async def process_custom_hours(message: Message, state: FSMContext):
         username = user.username if user.username else str(user_id)
         username_display = f"@{username}" if username else f"ID: {user_id}"
         time_left = format_time_remaining(user.expires_at)
-        expires_date = user.expires_at.strftime('%d.%m.%Y %H:%M')
+        expires_date = format_expires_date(user.expires_at)
         
         await message.answer(
             f"✅ <b>Доступ предоставлен!</b>\n\n"
@@ -718,7 +996,7 @@ async def process_vip_id(message: Message, state: FSMContext):
         data = await state.get_data()
         action = data.get('action')
         
-        user_id, username = await resolve_user_identifier(message.text)
+        user_id, username = resolve_user_identifier(message.text)
         
         if not user_id:
             await message.answer("❌ Не удалось определить пользователя. Попробуйте снова или /cancel")
@@ -748,13 +1026,14 @@ async def callback_add_vip(callback: CallbackQuery, state: FSMContext):
         await callback.answer("У вас нет доступа!")
         return
     
+    run_in_background(callback.answer())
+    
     await callback.message.answer(
         "👑 Отправьте ID пользователя для добавления в VIP:\n\n"
         "Отмена: /cancel"
     )
     await state.update_data(action='add')
     await state.set_state(UserManagement.waiting_for_vip_id)
-    await callback.answer()
 
 
 @dp.callback_query(F.data == "remove_vip")
@@ -764,13 +1043,14 @@ async def callback_remove_vip(callback: CallbackQuery, state: FSMContext):
         await callback.answer("У вас нет доступа!")
         return
     
+    run_in_background(callback.answer())
+    
     await callback.message.answer(
         "👑 Отправьте ID пользователя для удаления из VIP:\n\n"
         "Отмена: /cancel"
     )
     await state.update_data(action='remove')
     await state.set_state(UserManagement.waiting_for_vip_id)
-    await callback.answer()
 
 
 @dp.callback_query(F.data == "add_new_user")
@@ -779,6 +1059,8 @@ async def callback_add_new_user(callback: CallbackQuery, state: FSMContext):
         await callback.answer("У вас нет доступа!")
         return
     
+    run_in_background(callback.answer())
+    
     await callback.message.answer(
         "👤 Отправьте ID или @username пользователя:\n\n"
         "Примеры:\n"
@@ -787,7 +1069,6 @@ async def callback_add_new_user(callback: CallbackQuery, state: FSMContext):
         "Отмена: /cancel"
     )
     await state.set_state(UserManagement.waiting_for_user_id)
-    await callback.answer()
 
 
 @dp.callback_query(F.data.startswith("user_info:"))
@@ -803,28 +1084,31 @@ async def callback_user_info(callback: CallbackQuery):
         await callback.answer("Пользователь не найден!", show_alert=True)
         return
     
+    run_in_background(callback.answer())
+    
     username = f"@{user.username}" if user.username else f"ID: {user.user_id}"
     
     text = f"<b>👤 Пользователь: {username}</b>\n\n"
     
     if user.expires_at:
-        time_left = format_time_remaining(user.expires_at)
-        text += f"⏰ Доступ до: {user.expires_at.strftime('%d.%m.%Y %H:%M')}\n"
+        now = time.time()
+        time_left = format_time_remaining(user.expires_at, now)
+        text += f"⏰ Доступ до: {format_expires_date(user.expires_at)}\n"
         text += f"⏱ Осталось: {time_left}\n\n"
         
-        if user.expires_at <= datetime.now():
+        if user.expires_at <= now:
             text += "❌ <b>Доступ истек!</b>\n\n"
     else:
         text += "⏰ Время не установлено\n\n"
     
     text += "Выберите действие:"
     
-    await callback.message.edit_text(
+    await edit_message(
+        callback.message,
         text,
         parse_mode="HTML",
         reply_markup=create_time_keyboard(user_id)
     )
-    await callback.answer()
 
 
 @dp.callback_query(F.data.startswith("add_time:"))
@@ -847,11 +1131,12 @@ async def callback_add_time(callback: CallbackQuery):
     username_display = f"@{username}" if username else f"ID: {user_id}"
     time_left = format_time_remaining(user.expires_at)
     
-    await callback.message.edit_text(
+    await edit_message(
+        callback.message,
         f"✅ <b>Время обновлено!</b>\n\n"
         f"👤 {username_display}\n"
         f"➕ Добавлено: {hours} ч\n"
-        f"⏰ Доступ до: {user.expires_at.strftime('%d.%m.%Y %H:%M')}\n"
+        f"⏰ Доступ до: {format_expires_date(user.expires_at)}\n"
         f"⏱ Осталось: {time_left}\n\n"
         f"📨 Пользователю отправлено уведомление!",
         parse_mode="HTML",
@@ -867,6 +1152,8 @@ async def callback_custom_time(callback: CallbackQuery, state: FSMContext):
         await callback.answer("У вас нет доступа!")
         return
     
+    run_in_background(callback.answer())
+    
     user_id = int(callback.data.split(":")[1])
     
     await state.update_data(user_id=user_id)
@@ -877,7 +1164,6 @@ async def callback_custom_time(callback: CallbackQuery, state: FSMContext):
         "Например: 1.5 (полтора часа)\n\n"
         "Отмена: /cancel"
     )
-    await callback.answer()
 
 
 @dp.callback_query(F.data.startswith("remove_user:"))
@@ -893,16 +1179,15 @@ async def callback_remove_user(callback: CallbackQuery):
         username = user.username if user.username else str(user_id)
         
         try:
-            
-            await bot.ban_chat_member(CHANNEL_ID, user_id)
-            await bot.unban_chat_member(CHANNEL_ID, user_id)
+            await remove_from_channel(user_id)
             logger.info(f"Пользователь {user_id} удален из канала")
         except Exception as e:
             logger.error(f"Ошибка при удалении из канала: {e}")
         
         data_manager.remove_user(user_id)
         
-        await callback.message.edit_text(
+        await edit_message(
+            callback.message,
             f"✅ Пользователь @{username} удален из базы и канала.\n\n"
             "Используйте /users для просмотра списка."
         )
@@ -911,98 +1196,168 @@ async def callback_remove_user(callback: CallbackQuery):
         await callback.answer("Пользователь не найден!", show_alert=True)
 
 
+# Последний отрисованный список "назад к списку": (отпечаток, текст, клавиатура).
+# Отпечаток включает все, что видно в сообщении, поэтому отдельная инвалидация не нужна
+_list_render_cache: Optional[tuple] = None
+
+
 @dp.callback_query(F.data == "back_to_list")
 async def callback_back_to_list(callback: CallbackQuery):
+    global _list_render_cache
     if not is_admin(callback.from_user.id):
         await callback.answer("У вас нет доступа!")
         return
     
-    users = data_manager.get_all_users()
+    # Отвечаем сразу, чтобы клиент убрал индикатор загрузки, пока готовим список
+    run_in_background(callback.answer())
     
-    if not users:
-        await callback.message.edit_text("📭 Нет пользователей с ограниченным доступом.")
-        await callback.answer()
+    if not data_manager.users:
+        await edit_message(callback.message, "📭 Нет пользователей с ограниченным доступом.")
         return
     
-    active_users = [u for u in users if u.expires_at and u.expires_at > datetime.now()]
-    expired_users = [u for u in users if u.expires_at and u.expires_at <= datetime.now()]
+    now = time.time()
+    # Индекс уже отсортирован по времени истечения
+    active_users, expired_users = data_manager.split_by_expiry(now)
     
-    text = "<b>👥 Пользователи с доступом:</b>\n\n"
+    # Отпечаток - все, что видно в сообщении; пока он не изменился, переотправляем готовое
+    active_rows = tuple(
+        (user.user_id, user.username, int(user.expires_at - now) // 60)
+        for user in active_users
+    )
+    expired_rows = tuple((user.user_id, user.username) for user in expired_users)
+    fingerprint = (active_rows, expired_rows, vip_manager.count())
     
-    if active_users:
-        text += "<b>✅ Активные:</b>\n"
-        for user in sorted(active_users, key=lambda x: x.expires_at):
-            username = f"@{user.username}" if user.username else f"ID: {user.user_id}"
-            time_left = format_time_remaining(user.expires_at)
-            text += f"• {username}\n  ⏰ Осталось: {time_left}\n\n"
+    cached = _list_render_cache
+    if cached is not None and cached[0] == fingerprint:
+        _, text, keyboard = cached
+        await edit_message(callback.message, text, parse_mode="HTML", reply_markup=keyboard)
+        return
     
-    if expired_users:
-        text += "<b>⏰ Истекшие:</b>\n"
-        for user in expired_users:
-            username = f"@{user.username}" if user.username else f"ID: {user.user_id}"
-            text += f"• {username}\n  ❌ Доступ истек\n\n"
+    parts = ["<b>👥 Пользователи с доступом:</b>\n\n"]
+    
+    if active_rows:
+        parts.append("<b>✅ Активные:</b>\n")
+        parts.extend(render_user_row(*row) for row in active_rows)
     
-    text += f"\n<b>👑 VIP пользователей:</b> {len(vip_manager.get_all_vips())}"
+    if expired_rows:
+        parts.append("<b>⏰ Истекшие:</b>\n")
+        parts.extend(render_user_row(user_id, username, None) for user_id, username in expired_rows)
     
-    buttons = []
-    for user in active_users + expired_users:
-        username = user.username if user.username else str(user.user_id)
-        buttons.append([InlineKeyboardButton(
-            text=f"👤 {username}",
+    parts.append(f"\n<b>👑 VIP пользователей:</b> {vip_manager.count()}")
+    text = "".join(parts)
+    
+    buttons = [
+        [InlineKeyboardButton(
+            text=f"👤 {user.username or user.user_id}",
             callback_data=f"user_info:{user.user_id}"
-        )])
+        )]
+        for user in chain(active_users, expired_users)
+    ]
     
-    buttons.append([InlineKeyboardButton(
-        text="➕ Добавить пользователя",
-        callback_data="add_new_user"
-    )])
+    buttons.append(_ADD_USER_ROW)
     
     keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
+    _list_render_cache = (fingerprint, text, keyboard)
     
-    await callback.message.edit_text(text, parse_mode="HTML", reply_markup=keyboard)
-    await callback.answer()
+    await edit_message(callback.message, text, parse_mode="HTML", reply_markup=keyboard)
+
 
 
+def next_check_deadline(now: float) -> Optional[float]:
+    """Ближайший будущий момент, когда у кого-то истечет доступ или пора предупреждать.
+    
+    Просроченные записи (удаление или предупреждение не удалось) не учитываются -
+    они повторяются в обычном ритме CHECK_INTERVAL, а не каждую секунду.
+    """
+    deadline = None
+    for user in data_manager.iter_active(now):
+        if deadline is None:
+            deadline = user.expires_at
+        warn_at = user.expires_at - WARNING_SECONDS
+        if warn_at >= deadline:
+            break
+        if warn_at > now and not user.warning_sent and not is_special_user(user.user_id):
+            return warn_at
+    return deadline
+
 
 async def check_users_task():
+    delay: Optional[float] = 0
+    backoff = CHECK_INTERVAL
     while True:
         try:
-            await asyncio.sleep(CHECK_INTERVAL)
+            try:
+                await asyncio.wait_for(data_manager.expiry_changed.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            data_manager.expiry_changed.clear()
+            delay = CHECK_INTERVAL
             
-            now = datetime.now()
-            users = data_manager.get_all_users()
+            now = time.time()
             
-            for user in users:
-                if not user.expires_at:
-                    continue
-                
-                if user.expires_at <= now:
-                    logger.info(f"Время истекло для пользователя {user.user_id}")
-                    await kick_user(user.user_id)
-                    continue
-                
-                time_until_expire = (user.expires_at - now).total_seconds() / 3600
-                
-                if (time_until_expire <= WARNING_HOURS and 
-                    not user.warning_sent and
-                    not is_special_user(user.user_id)):
+            jobs = []
+            for user in data_manager.iter_expired(now):
+                logger.info(f"Время истекло для пользователя {user.user_id}")
+                jobs.append(kick_user(user.user_id))
+            
+            warning_threshold = now + WARNING_SECONDS
+            for user in data_manager.iter_needing_warning(now, warning_threshold):
+                if not is_special_user(user.user_id):
                     logger.info(f"Отправка предупреждения пользователю {user.user_id}")
-                    await send_warning(user.user_id)
+                    jobs.append(send_warning(user.user_id))
+            
+            # Независимые запросы к Telegram идут параллельно, но не больше CHECK_CONCURRENCY сразу
+            semaphore = asyncio.Semaphore(CHECK_CONCURRENCY)
+            await asyncio.gather(*(run_limited(semaphore, job) for job in jobs))
             
+            # Просыпаемся к ближайшему событию, если оно раньше очередной проверки
+            now = time.time()
+            deadline = next_check_deadline(now)
+            if deadline is not None:
+                delay = min(CHECK_INTERVAL, max(1, deadline - now))
+            elif data_manager.next_expiry() is None:
+                # Проверять некого - спим до появления пользователя со сроком (expiry_changed)
+                delay = None
+            backoff = CHECK_INTERVAL
+        
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
             logger.error(f"Ошибка в фоновой задаче: {e}")
+            # Экспоненциальная пауза, чтобы не крутиться в цикле ошибок, пока Telegram недоступен
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, CHECK_MAX_BACKOFF)
+            delay = 0
 
 
 
-async def main():
+@dp.shutdown()
+async def on_shutdown():
+    # Дожидаемся фоновых запросов, пока сессия бота еще открыта
+    await asyncio.gather(*_background_tasks, return_exceptions=True)
+    await data_manager.flush()
+    await vip_manager.flush()
+    logger.info("Данные сохранены перед остановкой")
 
-    asyncio.create_task(check_users_task())
+
+async def main():
     
-    await bot.delete_webhook(drop_pending_updates=True)
+    tasks = [
+        asyncio.create_task(check_users_task()),
+        asyncio.create_task(data_manager._writer_loop()),
+        asyncio.create_task(vip_manager._writer_loop()),
+    ]
     
-    logger.info("✅ Бот успешно запущен и готов к работе!")
-    logger.info("📝 Ожидание заявок на вступление...")
-    await dp.start_polling(bot)
+    try:
+        await bot.delete_webhook(drop_pending_updates=True)
+        
+        logger.info("✅ Бот успешно запущен и готов к работе!")
+        logger.info("📝 Ожидание заявок на вступление...")
+        await dp.start_polling(bot)
+    finally:
+        # Хранилище FSM и сессию бота закрывает сам aiogram после shutdown-обработчиков
+        for task in tasks:
+            task.cancel()
 
 
 if __name__ == "__main__":